@@ -3,34 +3,184 @@ import pandas as pd
 import pyupbit
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from notion_client import Client
 from dotenv import load_dotenv
 import logging
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from numba import njit
 
 load_dotenv()
 
+# Credentials are read once at import; the bot runs for the life of the process
+_NOTION_API = os.environ.get('NOTION_API')
+_DATABASE_ID = os.environ.get('DATABASE_ID')
+_NOTION = Client(auth=_NOTION_API) if _NOTION_API else None
+_TG_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+_TG_CHAT = os.getenv('TELEGRAM_CHAT_ID')
+_TG_URL = f"https://api.telegram.org/bot{_TG_TOKEN}/sendMessage"
+
+# Shared HTTP session so Telegram calls reuse pooled keep-alive connections
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4,
+                                       max_retries=Retry(total=3, backoff_factor=0.3)))
+
+@njit(cache=True)
+def _ewma(x, span):
+    """Recursive EWMA, equivalent to pandas ewm(span=span, adjust=False).mean()."""
+    alpha = 2.0 / (span + 1.0)
+    out = np.empty_like(x)
+    out[0] = x[0]
+    for i in range(1, x.shape[0]):
+        out[i] = alpha * x[i] + (1.0 - alpha) * out[i - 1]
+    return out
+
+# Slots of the rolling-mean state array built by _rolling_state: running sum,
+# Kahan compensation for adds and for removes, non-NaN count, count of
+# negative values, run length of equal values, and the last value pushed
+_SUM, _ADD_COMP, _REM_COMP, _NOBS, _NEG_CT, _SAME_RUN, _LAST = range(7)
+_STATE_SIZE = 7
+
+@njit(cache=True)
+def _rolling_state():
+    acc = np.zeros(_STATE_SIZE)
+    acc[_LAST] = np.nan
+    return acc
+
+@njit(cache=True)
+def _rolling_push(ring, acc, i, x):
+    """Push x as the i-th value of a fixed-size rolling window and return the window mean.
+
+    acc is the state from _rolling_state, indexed by the slot constants above.
+    This follows pandas' rolling mean (Kahan-compensated running sum, exact
+    result for a window of equal values, sign clamping), so ties between
+    lines come out the same as with pandas. The result is NaN until the
+    window is full and while it holds a NaN.
+    """
+    w = ring.shape[0]
+    j = i % w
+    if i >= w:
+        old = ring[j]
+        if not np.isnan(old):
+            y = -old - acc[_REM_COMP]
+            t = acc[_SUM] + y
+            acc[_REM_COMP] = t - acc[_SUM] - y
+            acc[_SUM] = t
+            acc[_NOBS] -= 1.0
+            if old < 0:
+                acc[_NEG_CT] -= 1.0
+    ring[j] = x
+    if not np.isnan(x):
+        y = x - acc[_ADD_COMP]
+        t = acc[_SUM] + y
+        acc[_ADD_COMP] = t - acc[_SUM] - y
+        acc[_SUM] = t
+        acc[_NOBS] += 1.0
+        if x < 0:
+            acc[_NEG_CT] += 1.0
+        if x == acc[_LAST]:
+            acc[_SAME_RUN] += 1.0
+        else:
+            acc[_SAME_RUN] = 1.0
+        acc[_LAST] = x
+    nobs = acc[_NOBS]
+    if nobs < w:
+        return np.nan
+    if acc[_SAME_RUN] >= nobs:
+        return acc[_LAST]
+    mean = acc[_SUM] / nobs
+    if acc[_NEG_CT] == 0 and mean < 0:
+        return 0.0
+    if acc[_NEG_CT] == nobs and mean > 0:
+        return 0.0
+    return mean
+
+@njit(cache=True)
+def _ying_yang_kernel(close, window, span, ema):
+    """Compute ma, yang/ying/total volatility, YYL and YYL_slow in a single pass over close.
+
+    Only the volatility outputs are stored as float32. ma stays float64 since
+    it is a price level that the Pan Bands build on, and YYL/YYL_slow stay
+    float64 because trading_signal compares them for exact ties, which
+    float32 rounding would create. Arithmetic and running sums are kept in
+    float64, because close - ma cancels most of the significant digits.
+    """
+    n = close.shape[0]
+    ma = np.empty(n)
+    yang_vol = np.empty(n, dtype=np.float32)
+    ying_vol = np.empty(n, dtype=np.float32)
+    total_vol = np.empty(n, dtype=np.float32)
+    yyl = np.empty(n)
+    yyl_slow = np.empty(n)
+
+    ma_ring = np.empty(window)
+    ma_acc = _rolling_state()
+    pos_ring = np.empty(window)
+    pos_acc = _rolling_state()
+    neg_ring = np.empty(window)
+    neg_acc = _rolling_state()
+    yyl_ring = np.empty(span)
+    yyl_acc = _rolling_state()
+
+    alpha = 2.0 / (window + 1.0)
+    m = 0.0
+    for i in range(n):
+        x = close[i]
+        if ema:
+            m = x if i == 0 else alpha * x + (1.0 - alpha) * m
+        else:
+            m = _rolling_push(ma_ring, ma_acc, i, x)
+        ma[i] = m
+
+        d = x - m
+        d2 = d * d
+        pos = 0.0 if d <= 0 else d2
+        neg = d2 - pos
+
+        yang = np.sqrt(_rolling_push(pos_ring, pos_acc, i, pos))
+        ying = np.sqrt(_rolling_push(neg_ring, neg_acc, i, neg))
+        total = np.sqrt(yang * yang + ying * ying)
+        level = np.nan if total == 0.0 else (yang - ying) / total * 100
+
+        yang_vol[i] = yang
+        ying_vol[i] = ying
+        total_vol[i] = total
+        yyl[i] = level
+        yyl_slow[i] = _rolling_push(yyl_ring, yyl_acc, i, level)
+
+    return ma, yang_vol, ying_vol, total_vol, yyl, yyl_slow
+
 class YingYangTradingBot:
     def __init__(self, symbol, interval, count, ema=True, window=20, span=10, stop_loss_percentage=5, take_profit_percentage=10):
         self.symbol = symbol
+        parts = symbol.split('-')
+        if len(parts) != 2:
+            raise ValueError(f"Invalid symbol '{symbol}'. Expected QUOTE-BASE format, e.g. 'KRW-BTC'")
+        self._quote_currency, self._base_currency = parts
         self.interval = interval
         self.count = count
         self.ema = ema
         self.window = window
         self.span = span
         self.price = None
+        self._close = None
         self.ying_yang_vol = None
         self.pan_bands = None
         self.signals = None
         self.last_signal = None
+        self._ma_span = None
+        self._last_bar = None
         self.stop_loss_percentage = stop_loss_percentage
         self.take_profit_percentage = take_profit_percentage
         self.stop_loss_price = None
         self.take_profit_price = None
         
-        # Set up logging
-        logging.basicConfig(filename='trading_bot.log', level=logging.INFO, 
-                            format='%(asctime)s - %(levelname)s - %(message)s')
+        # Set up logging unless the caller already has
+        if not logging.getLogger().handlers:
+            logging.basicConfig(filename='trading_bot.log', level=logging.INFO, 
+                                format='%(asctime)s - %(levelname)s - %(message)s')
         
         # Initialize Upbit client
         access_key = os.getenv("ACCESS_KEY")
@@ -40,17 +190,33 @@ class YingYangTradingBot:
             raise ValueError("ACCESS_KEY and SECRET_KEY must be set in the .env file")
         
         self.upbit = pyupbit.Upbit(access_key, secret_key)
+        self._balances = None
         
         # Check if authentication was successful
-        if not self.upbit.get_balances():
+        if not self._refresh_balances():
             logging.error("Failed to authenticate with Upbit API")
             raise ValueError("Failed to authenticate with Upbit API. Please check your ACCESS_KEY and SECRET_KEY")
         
         self.position = self.get_current_position()
     
+    def _refresh_balances(self):
+        # One authenticated call per cycle; get_balance() would cost one per currency
+        balances = self.upbit.get_balances()
+        if isinstance(balances, list):
+            self._balances = {b['currency']: float(b['balance']) for b in balances}
+        else:
+            self._balances = None
+        return self._balances
+
+    def _get_balance(self, currency):
+        # Same contract as Upbit.get_balance: None if unavailable, 0 if not held
+        if self._balances is None:
+            return None
+        return self._balances.get(currency, 0.0)
+
     def get_current_position(self):
         try:
-            btc_balance = self.upbit.get_balance(self.symbol.split('-')[1])
+            btc_balance = self._get_balance(self._base_currency)
             if btc_balance is None:
                 logging.warning(f"Unable to get balance for {self.symbol}. Assuming neutral position.")
                 return "neutral"
@@ -61,9 +227,23 @@ class YingYangTradingBot:
 
     def download_data(self):
         try:
-            self.price = pyupbit.get_ohlcv(self.symbol, self.interval, self.count)
             if self.price is None or self.price.empty:
+                price = pyupbit.get_ohlcv(self.symbol, self.interval, self.count)
+            else:
+                # Only the last few bars change between cycles; fetch those and splice them in
+                latest = pyupbit.get_ohlcv(self.symbol, self.interval, 3)
+                if latest is None or latest.empty:
+                    raise ValueError(f"Failed to download data for {self.symbol}")
+                if latest.index[0] in self.price.index:
+                    price = pd.concat([self.price, latest])
+                    price = price[~price.index.duplicated(keep='last')].sort_index().tail(self.count)
+                else:
+                    # Bars were missed (e.g. downtime), so the history has a gap; start over
+                    price = pyupbit.get_ohlcv(self.symbol, self.interval, self.count)
+            if price is None or price.empty:
                 raise ValueError(f"Failed to download data for {self.symbol}")
+            self.price = price
+            self._close = self.price['close'].to_numpy(dtype=np.float64, copy=False)
             return self.price
         except Exception as e:
             logging.error(f"Error downloading data: {str(e)}")
@@ -73,20 +253,11 @@ class YingYangTradingBot:
         if self.price is None or self.price.empty:
             raise ValueError("Price data is not available. Please download data first.")
         
-        price_close = self.price['close']
-        if self.ema:
-            ma = price_close.ewm(span=self.window, adjust=False).mean()
-        else:
-            ma = price_close.rolling(window=self.window).mean()
-
-        diff = price_close - ma
-        slow_window = self.span
-
-        yang_vol = np.sqrt((diff**2 * (diff > 0)).rolling(window=self.window).mean())
-        ying_vol = np.sqrt((diff**2 * (diff <= 0)).rolling(window=self.window).mean())
-        total_vol = np.sqrt(yang_vol**2 + ying_vol**2)
-        YYL = ((yang_vol - ying_vol) / total_vol) * 100
-        YYL_slow = YYL.rolling(window=slow_window).mean()
+        ma, yang_vol, ying_vol, total_vol, YYL, YYL_slow = _ying_yang_kernel(
+            self._close, int(self.window), int(self.span), bool(self.ema)
+        )
+        # The Pan Bands span-EWMA is this same series when the spans match
+        self._ma_span = ma if self.ema and self.window == self.span else None
 
         self.ying_yang_vol = pd.DataFrame({
             'ma': ma,
@@ -95,7 +266,7 @@ class YingYangTradingBot:
             'total_vol': total_vol,
             'YYL': YYL,
             'YYL_slow': YYL_slow
-        })
+        }, index=self.price.index, copy=False)
 
         return self.ying_yang_vol
 
@@ -103,16 +274,18 @@ class YingYangTradingBot:
         if self.ying_yang_vol is None:
             raise ValueError("Volatility must be calculated before Pan Bands.")
         
-        ma = self.price['close'].ewm(span=self.span, adjust=False).mean()
-        upper_band = ma + 2 * self.ying_yang_vol['yang_vol']
-        lower_band = ma - 2 * self.ying_yang_vol['ying_vol']
+        if self._ma_span is None:
+            self._ma_span = _ewma(self._close, int(self.span))
+        ma = self._ma_span
+        upper_band = ma + 2 * self.ying_yang_vol['yang_vol'].to_numpy()
+        lower_band = ma - 2 * self.ying_yang_vol['ying_vol'].to_numpy()
         
         self.pan_bands = pd.DataFrame({
             'upper_band': upper_band,
             'lower_band': lower_band,
             'pan_river_up': (ma + upper_band) / 2,
             'pan_river_down': (ma + lower_band) / 2
-        })
+        }, index=self.price.index, copy=False)
 
         return self.pan_bands
 
@@ -120,39 +293,49 @@ class YingYangTradingBot:
         if self.ying_yang_vol is None or self.pan_bands is None:
             raise ValueError("Volatility and Pan Bands must be calculated before generating signals.")
         
-        df = self.ying_yang_vol.join(self.pan_bands).join(self.price['close'])
+        df = self.ying_yang_vol
+        yyl = df['YYL'].to_numpy()
+        yyl_slow = df['YYL_slow'].to_numpy()
+        close = self._close
+        n = len(df)
 
-        signals = pd.DataFrame(index=df.index, columns=['Signal', 'Position', 'Entry_Price', 'Exit_Price'])
-        signals = signals.fillna(0)
+        # Rows where either line is NaN fail both comparisons and get a neutral (0) status
+        status = np.select([yyl > yyl_slow, yyl < yyl_slow], [1, -1], default=0).astype(np.int8)
+        crossings = np.concatenate((np.zeros(1, dtype=np.int8), np.diff(status)))
 
-        status = df.apply(
-            lambda row: 1 if row['YYL'] > row['YYL_slow'] else (-1 if row['YYL'] < row['YYL_slow'] else 0),
-            axis=1
-        )
-        prev_status = status.shift(1)
-
-        for i in range(1, len(df)):
-            current_status = status.iloc[i]
-            previous_status = prev_status.iloc[i]
-            current_price = df['close'].iloc[i]
-
-            signal_diff = current_status - previous_status
-
-            if (signal_diff == 2 or signal_diff == 1) and df['YYL'].iloc[i] < -75:
-                signals['Signal'].iloc[i] = 1
-                signals['Entry_Price'].iloc[i] = current_price
-            elif (signal_diff == -2 or signal_diff == -1) and df['YYL'].iloc[i] > 75:
-                signals['Signal'].iloc[i] = -1
-                signals['Exit_Price'].iloc[i] = current_price
-            elif self.position == "long":
-                if self.stop_loss_price and current_price <= self.stop_loss_price:
-                    signals['Signal'].iloc[i] = -1
-                    signals['Exit_Price'].iloc[i] = current_price
-                    logging.info(f"Stop loss triggered at {current_price}")
-                elif self.take_profit_price and current_price >= self.take_profit_price:
-                    signals['Signal'].iloc[i] = -1
-                    signals['Exit_Price'].iloc[i] = current_price
-                    logging.info(f"Take profit triggered at {current_price}")
+        buy_mask = (crossings >= 1) & (yyl < -75)
+        sell_mask = (crossings <= -1) & (yyl > 75)
+
+        if self.position == "long":
+            no_cross = ~(buy_mask | sell_mask)
+            no_cross[0] = False
+            stop_mask = np.zeros(n, dtype=bool)
+            take_mask = np.zeros(n, dtype=bool)
+            if self.stop_loss_price:
+                stop_mask = no_cross & (close <= self.stop_loss_price)
+            if self.take_profit_price:
+                take_mask = no_cross & ~stop_mask & (close >= self.take_profit_price)
+            for price in close[stop_mask]:
+                logging.info(f"Stop loss triggered at {price}")
+            for price in close[take_mask]:
+                logging.info(f"Take profit triggered at {price}")
+            sell_mask = sell_mask | stop_mask | take_mask
+
+        sig = np.zeros(n, dtype=np.int8)
+        pos = np.zeros(n, dtype=np.int8)
+        entry = np.zeros(n, dtype=np.float64)
+        exit_ = np.zeros(n, dtype=np.float64)
+        sig[buy_mask] = 1
+        entry[buy_mask] = close[buy_mask]
+        sig[sell_mask] = -1
+        exit_[sell_mask] = close[sell_mask]
+
+        signals = pd.DataFrame({
+            'Signal': sig,
+            'Position': pos,
+            'Entry_Price': entry,
+            'Exit_Price': exit_
+        }, index=df.index, copy=False)
 
         self.signals = signals
         return self.signals
@@ -160,12 +343,12 @@ class YingYangTradingBot:
     def get_last_signal(self):
         if self.signals is None:
             raise ValueError("Trading signals must be generated before getting last signal.")
-        df = self.ying_yang_vol.join(self.pan_bands).join(self.price['close']).join(self.signals).dropna()
         
-        timestamp = df.index[-1]
-        last_signal_value = df['Signal'].iloc[-1]
+        # Only the latest bar is needed, so read its scalars directly
+        timestamp = self.price.index[-1]
+        last_signal_value = int(self.signals['Signal'].iat[-1])
         last_signal_str = 'Buy' if last_signal_value == 1 else 'Sell' if last_signal_value == -1 else 'No Signal'
-        last_entry_price = df['close'].iloc[-1]
+        last_entry_price = self._close[-1]
         
         last_signal_df = pd.DataFrame({
             'Ticker': [self.symbol],
@@ -187,24 +370,26 @@ class YingYangTradingBot:
 
         try:
             if signal == 'Buy' and self.position == "neutral":
-                krw_balance = self.upbit.get_balance("KRW")
+                krw_balance = self._get_balance(self._quote_currency)
                 if krw_balance is None:
-                    raise ValueError("Unable to get KRW balance")
+                    raise ValueError(f"Unable to get {self._quote_currency} balance")
                 amount = krw_balance * 0.3  # 30% of total KRW balance
                 order = self.upbit.buy_market_order(self.symbol, amount)
                 if order and 'error' not in order:
+                    self._refresh_balances()
                     self.position = "long"
                     self.stop_loss_price = price * (1 - self.stop_loss_percentage / 100)
                     self.take_profit_price = price * (1 + self.take_profit_percentage / 100)
-                    return f"Bought {self.symbol} for {amount} KRW (30% of balance). Stop Loss: {self.stop_loss_price:.2f}, Take Profit: {self.take_profit_price:.2f}"
+                    return f"Bought {self.symbol} for {amount} {self._quote_currency} (30% of balance). Stop Loss: {self.stop_loss_price:.2f}, Take Profit: {self.take_profit_price:.2f}"
                 else:
                     raise ValueError(f"Buy order failed: {order.get('error', 'Unknown error')}")
             elif signal == 'Sell' and self.position == "long":
-                btc_balance = self.upbit.get_balance(self.symbol.split('-')[1])
+                btc_balance = self._get_balance(self._base_currency)
                 if btc_balance is None:
                     raise ValueError(f"Unable to get {self.symbol} balance")
                 order = self.upbit.sell_market_order(self.symbol, btc_balance)
                 if order and 'error' not in order:
+                    self._refresh_balances()
                     self.position = "neutral"
                     self.stop_loss_price = None
                     self.take_profit_price = None
@@ -218,17 +403,17 @@ class YingYangTradingBot:
             return f"Trade execution failed: {str(e)}"
 
     def notion_update(self):
-        NOTION_API = os.environ.get('NOTION_API')
-        DATABASE_ID = os.environ.get('DATABASE_ID')
-        notion = Client(auth=NOTION_API)
-
         if self.last_signal is None:
             raise ValueError("Last signal must be generated before updating Notion.")
 
+        if _NOTION is None:
+            logging.error("NOTION_API must be set as an environment variable.")
+            return
+
         signal_data = self.last_signal.iloc[0]
         
         new_page = {
-            "parent": {"database_id": DATABASE_ID},
+            "parent": {"database_id": _DATABASE_ID},
             "properties": {
                 "Ticker": {"title": [{"text": {"content": signal_data['Ticker']}}]},
                 "Signal_time": {"rich_text": [{"text": {"content": signal_data['timestamp'].isoformat()}}]},
@@ -242,26 +427,22 @@ class YingYangTradingBot:
                 "Take_profit": {"number": self.take_profit_price if self.take_profit_price else None}
             }
         }
-        notion.pages.create(**new_page)
+        _NOTION.pages.create(**new_page)
         logging.info(f"Notion updated: {signal_data['Ticker']} - {signal_data['last_signal']} at {signal_data['entry_price']}, Position: {self.position}, Interval: {self.interval}, Stop Loss: {self.stop_loss_price}, Take Profit: {self.take_profit_price}")
 
     def send_telegram_message(self, message):
-        TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
-        TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
-
-        if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+        if not _TG_TOKEN or not _TG_CHAT:
             logging.error("TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID must be set as environment variables.")
             return
 
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
         payload = {
-            'chat_id': TELEGRAM_CHAT_ID,
+            'chat_id': _TG_CHAT,
             'text': message,
             'parse_mode': 'Markdown'
         }
         
         try:
-            response = requests.post(url, data=payload)
+            response = _SESSION.post(_TG_URL, data=payload, timeout=5)
             response.raise_for_status()
             logging.info(f"Telegram message sent: {message}")
         except requests.exceptions.RequestException as e:
@@ -270,13 +451,25 @@ class YingYangTradingBot:
     def run(self):
         try:
             self.download_data()
+            # The last bar is the candle still in progress, so its timestamp alone is not enough:
+            # skip only when both the timestamp and its OHLCV values are unchanged since the last cycle
+            last_bar = self.price.iloc[-1:]
+            if self._last_bar is not None and last_bar.equals(self._last_bar):
+                logging.info(f"No price change for {self.symbol} since {last_bar.index[-1]}, skipping cycle")
+                return
+            self._refresh_balances()
+            if self._balances is not None:
+                # Follow the exchange, not our own bookkeeping: manual trades or partial fills change the holding
+                self.position = self.get_current_position()
+                if self.position != "long":
+                    self.stop_loss_price = None
+                    self.take_profit_price = None
             self.calculate_volatility()
             self.calculate_pan_bands()
             self.trading_signal()
             self.get_last_signal()
             
             trade_result = self.execute_trade()
-            self.notion_update()
             
             message = f"YingYang Bot Update for {self.symbol}:\n"
             message += f"Interval: {self.interval}\n"
@@ -292,7 +485,15 @@ class YingYangTradingBot:
                 message += f"Take Profit: {self.take_profit_price:.2f}\n"
             message += f"Trade Result: {trade_result}"
             
-            self.send_telegram_message(message)
+            # Notion and Telegram are independent network calls; overlap them
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                futures = [
+                    executor.submit(self.notion_update),
+                    executor.submit(self.send_telegram_message, message)
+                ]
+                for future in as_completed(futures):
+                    future.result()
+            self._last_bar = self.price.iloc[-1:]
             logging.info(f"Bot cycle completed: {message}")
         except Exception as e:
             error_message = f"Error in bot execution: {str(e)}"
@@ -1,40 +1,31 @@
-import time
 import os
-from dotenv import load_dotenv
+import signal
+import threading
 from class_yingyangvol import YingYangTradingBot
 import logging
 from datetime import datetime, timedelta
 
-def run_bot():
-    load_dotenv()
+# Set by SIGINT/SIGTERM to wake the main loop out of its wait immediately
+_stop = threading.Event()
 
-    ticker = 'KRW-BTC'
-    interval = 'minute30'
-    count = 300
-
-    try:
-        bot = YingYangTradingBot(ticker, interval, count, ema=True, window=20, span=10, stop_loss_percentage=5, take_profit_percentage=10)
-        bot.run()
-    except Exception as e:
-        logging.error(f"Error running bot: {str(e)}")
-        print(f"Error running bot: {str(e)}")
+def _request_stop(signum, frame):
+    _stop.set()
 
-def get_next_run_time():
-    now = datetime.now()
-    next_run = now.replace(second=0, microsecond=0)
-    
-    if now.minute < 30:
-        next_run = next_run.replace(minute=30)
-    else:
-        next_run = (next_run + timedelta(hours=1)).replace(minute=0)
-    
-    return next_run
+def get_next_run_time(interval_minutes=30):
+    now = datetime.now().replace(second=0, microsecond=0)
+    # Next multiple of interval_minutes since midnight; rolls over past 24:00 via timedelta
+    total = now.hour * 60 + now.minute
+    next_total = (total // interval_minutes + 1) * interval_minutes
+    return now.replace(hour=0, minute=0) + timedelta(minutes=next_total)
 
 def main():
     # Set up logging
     logging.basicConfig(filename='trading_bot.log', level=logging.INFO, 
                         format='%(asctime)s - %(levelname)s - %(message)s')
 
+    signal.signal(signal.SIGINT, _request_stop)
+    signal.signal(signal.SIGTERM, _request_stop)
+
     print("YingYang Trading Bot started")
     logging.info("YingYang Trading Bot started")
 
@@ -42,9 +33,14 @@ def main():
     with open("bot_running.txt", "w") as f:
         f.write("Bot is running. Delete this file to stop the bot.")
 
-    # Send initial Telegram message
+    ticker = 'KRW-BTC'
+    interval = 'minute30'
+    interval_minutes = 30
+    count = 300
+
+    # Create the bot once and reuse it for every cycle, then send initial Telegram message
     try:
-        bot = YingYangTradingBot('KRW-BTC', 'minute30', 300, stop_loss_percentage=5, take_profit_percentage=10)
+        bot = YingYangTradingBot(ticker, interval, count, ema=True, window=20, span=10, stop_loss_percentage=5, take_profit_percentage=10)
         start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         bot.send_telegram_message(f"YingYang Trading Bot started at {start_time} with 30-minute intervals, 5% stop loss, and 10% take profit")
     except Exception as e:
@@ -53,19 +49,22 @@ def main():
         print(error_message)
         return
 
-    while os.path.exists("bot_running.txt"):
-        next_run = get_next_run_time()
+    while os.path.exists("bot_running.txt") and not _stop.is_set():
+        next_run = get_next_run_time(interval_minutes)
         now = datetime.now()
         
         if now < next_run:
             sleep_time = (next_run - now).total_seconds()
             logging.info(f"Waiting until {next_run.strftime('%Y-%m-%d %H:%M:%S')} for next run")
-            time.sleep(sleep_time)
+            if _stop.wait(sleep_time):
+                break
+            if not os.path.exists("bot_running.txt"):
+                break
         
-        run_bot()
+        bot.run()
         
         # Log that the bot completed a cycle
-        logging.info(f"Bot cycle completed. Next run at {get_next_run_time().strftime('%Y-%m-%d %H:%M:%S')}")
+        logging.info(f"Bot cycle completed. Next run at {get_next_run_time(interval_minutes).strftime('%Y-%m-%d %H:%M:%S')}")
 
     print("YingYang Trading Bot stopped")
     logging.info("YingYang Trading Bot stopped")